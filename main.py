@@ -1,13 +1,26 @@
 import os
 import json
+import asyncio
+import hashlib
 import discord
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
 import uuid
+from collections import Counter, deque
+from dataclasses import astuple, dataclass, fields
 from datetime import datetime
+from itertools import islice
 import logging
+import random
 import re
+import sqlite3
+import time
+
+try:
+    import orjson
+except ImportError:  # Optional speedup, fall back to the standard library
+    orjson = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,10 +31,27 @@ TOKEN = os.getenv("token")
 if not TOKEN:
     raise ValueError("Discord bot token not found. Please check your .env file.")
 
-SETTINGS_FILE = "settings.json"
-BACKUP_FILE = "review_backup.json"
+SETTINGS_DB = "settings.db"
+LEGACY_SETTINGS_FILE = "settings.json"  # JSON document format used before SQLite
+BACKUP_FILE = "review_backup.jsonl"
+LEGACY_BACKUP_FILE = "review_backup.json"  # Single-document format used before JSON Lines
+
+COMMAND_HASH_FILE = ".command_hash"  # Hash of the command tree last synced with Discord
 
 MAX_REVIEW_LENGTH = 1000
+
+METRICS_LOG_INTERVAL = 300  # Seconds between metric summaries in the log
+
+# In-process counters (send retries, cache hits, errors, command latencies), logged periodically
+_metrics = Counter()
+
+# Posted by /generate and /settings; never mutated, so one instance is shared by every send
+REVIEW_EMBED = discord.Embed(
+    title="💬 Leave a Review",
+    description="Click the button below to review a staff member of this server.",
+    color=discord.Color.blurple()
+)
+
 SUSPICIOUS_PATTERNS = [
     r'@everyone',
     r'@here', 
@@ -30,118 +60,465 @@ SUSPICIOUS_PATTERNS = [
     r'https?://tinyurl\.com/',
     r'<@&\d+>',  # Mass role mentions
 ]
+# All patterns fused into one alternation so content is scanned once
+_SUSPICIOUS_RE = re.compile("|".join(SUSPICIOUS_PATTERNS), re.IGNORECASE)
+MAX_MENTIONS = 3
+_MENTION_RE = re.compile(r'<[@#]')
+# Translation table deleting markdown characters in a single pass
+_STRIP_MARKDOWN = str.maketrans('', '', '`*_~')
+# Every markdown character stripped above and every suspicious pattern or mention
+# contains at least one of these, so content without them needs no further work
+_SENTINELS = '`*_~@</'
+
+def _truncate_err(e: BaseException, limit: int = 100) -> str:
+    """Return the error message, cut to limit characters for user-facing replies"""
+    message = str(e)
+    return message if len(message) <= limit else f"{message[:limit]}..."
+
+async def _respond(interaction: discord.Interaction, msg: str, ephemeral: bool = True):
+    """Reply to an interaction, as a followup if it was already responded to or deferred"""
+    if interaction.response.is_done():
+        await interaction.followup.send(msg, ephemeral=ephemeral)
+    else:
+        await interaction.response.send_message(msg, ephemeral=ephemeral)
+
+async def _err(interaction: discord.Interaction, msg: str):
+    """Send an ephemeral error reply"""
+    await _respond(interaction, f"❌ {msg}")
+
+async def _ok(interaction: discord.Interaction, msg: str):
+    """Send an ephemeral success reply"""
+    await _respond(interaction, f"✅ {msg}")
+
+async def _err_safely(interaction: discord.Interaction, msg: str):
+    """Send an error reply from an except block, logging rather than raising if it can't be delivered"""
+    try:
+        await _err(interaction, msg)
+    except discord.HTTPException as e:
+        # e.g. the interaction expired (Unknown interaction); the original error was already logged
+        logger.warning(f"Could not send error reply: {e}")
+
+async def _report_error(interaction: discord.Interaction, e: Exception, command: str, handlers: dict, fallback: str):
+    """
+    Log e and send the reply of the first handler matching its type.
+    handlers maps exception types to (log prefix, reply), checked in order so subclasses must
+    come first; a None reply shows the truncated error, unmatched errors use fallback.
+    command is the command's name, used in the log and as the metric key.
+    """
+    for exc_type, (log_prefix, user_msg) in handlers.items():
+        if isinstance(e, exc_type):
+            break
+    else:
+        log_prefix, user_msg = "Unexpected error", f"{fallback}: {_truncate_err(e)}"
+    _metrics[f"errors.{command}"] += 1
+    logger.error(f"{log_prefix} in {command} command: {e}")
+    await _err(interaction, user_msg or f"{log_prefix}: {_truncate_err(e)}")
 
 def sanitize_content(content: str) -> tuple[str, bool]:
     """
     Sanitize review content and check for suspicious patterns.
     Returns (sanitized_content, is_suspicious)
     """
+    # Fast path for plain text: nothing to strip and nothing to flag
+    if not any(c in content for c in _SENTINELS):
+        return content[:MAX_REVIEW_LENGTH], False
+    
     # Remove potential markdown abuse
-    sanitized = content.replace('`', '').replace('*', '').replace('_', '').replace('~', '')
+    sanitized = content.translate(_STRIP_MARKDOWN)
     
     # Check for suspicious patterns
-    is_suspicious = False
-    for pattern in SUSPICIOUS_PATTERNS:
-        if re.search(pattern, content, re.IGNORECASE):
-            is_suspicious = True
-            break
+    is_suspicious = _SUSPICIOUS_RE.search(content) is not None
     
-    # Check for excessive mentions
-    mention_count = content.count('<@') + content.count('<#')
-    if mention_count > 3:
+    # Check for excessive mentions in one scan, stopping at the first mention over the limit
+    if next(islice(_MENTION_RE.finditer(content), MAX_MENTIONS, None), None) is not None:
         is_suspicious = True
     
     return sanitized[:MAX_REVIEW_LENGTH], is_suspicious
 
-if not os.path.exists(SETTINGS_FILE):
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump({}, f)
+def _dumps(data) -> bytes:
+    """Serialize data to compact JSON bytes, using orjson when it is available"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
 
-if not os.path.exists(BACKUP_FILE):
-    with open(BACKUP_FILE, "w") as f:
-        json.dump({}, f)
+def _loads(raw: bytes):
+    """Parse JSON bytes, using orjson when it is available"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
 
-def load_settings():
-    """Load settings with error handling and validation"""
+@dataclass(slots=True)
+class GuildConfig:
+    """Settings for one guild; unset values are None"""
+    review_channel: int | None = None
+    testimonial_channel: int | None = None
+    reviewable_role: int | None = None
+    reward_role: int | None = None
+    review_message_id: int | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GuildConfig":
+        """Build a config from its settings.json entry, ignoring unknown keys; raises ValueError on non-id values"""
+        values = {name: data.get(name) for name in _GUILD_CONFIG_FIELDS}
+        for name, value in values.items():
+            # bool is an int subclass but never a valid id
+            if value is not None and (type(value) is not int):
+                raise ValueError(f"{name} must be an id, got {value!r}")
+        return cls(**values)
+
+    @property
+    def has_review_message(self) -> bool:
+        """Whether a review message was posted whose button view can be attached"""
+        return bool(self.testimonial_channel and self.review_message_id)
+
+_GUILD_CONFIG_FIELDS = tuple(field.name for field in fields(GuildConfig))
+
+def _read_legacy_settings():
+    """
+    Read the old settings.json into {guild_id: GuildConfig} with error handling and validation.
+    Returns None if the file exists but can't be read, so migration is retried on the next start.
+    """
     try:
-        if not os.path.exists(SETTINGS_FILE):
-            return {}
-        with open(SETTINGS_FILE, "r", encoding='utf-8') as f:
-            settings = json.load(f)
-            # Validate settings structure
-            if not isinstance(settings, dict):
-                logger.warning("Invalid settings format, resetting to empty dict")
-                return {}
-            return settings
-    except (json.JSONDecodeError, IOError) as e:
+        with open(LEGACY_SETTINGS_FILE, "rb") as f:
+            settings = _loads(f.read())
+    except FileNotFoundError:
+        return {}
+    except (ValueError, IOError) as e:
+        logger.error(f"Failed to read legacy settings: {e}")
+        return None
+    # Validate settings structure
+    if not isinstance(settings, dict):
+        logger.warning("Invalid legacy settings format, skipping migration")
+        return {}
+    legacy = {}
+    for guild_id, data in settings.items():
+        # JSON object keys are strings; guild ids are ints everywhere else
+        try:
+            legacy[int(guild_id)] = GuildConfig.from_dict(data)
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Skipping invalid legacy settings entry {guild_id!r}: {e}")
+    return legacy
+
+# One row per guild, so a change rewrites that row instead of every guild's settings
+_SETTINGS_COLUMNS = ", ".join(_GUILD_CONFIG_FIELDS)
+_CREATE_SETTINGS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS guild_settings (guild_id INTEGER PRIMARY KEY, "
+    + ", ".join(f"{name} INTEGER" for name in _GUILD_CONFIG_FIELDS) + ")"
+)
+_UPSERT_SETTINGS = (
+    f"INSERT INTO guild_settings (guild_id, {_SETTINGS_COLUMNS}) "
+    f"VALUES (?, {', '.join('?' for _ in _GUILD_CONFIG_FIELDS)}) "
+    "ON CONFLICT(guild_id) DO UPDATE SET "
+    + ", ".join(f"{name}=excluded.{name}" for name in _GUILD_CONFIG_FIELDS)
+)
+_DELETE_SETTINGS = "DELETE FROM guild_settings WHERE guild_id = ?"
+# A retried migration must not overwrite settings changed since the database was created
+_MIGRATE_SETTINGS = (
+    f"INSERT INTO guild_settings (guild_id, {_SETTINGS_COLUMNS}) "
+    f"VALUES (?, {', '.join('?' for _ in _GUILD_CONFIG_FIELDS)}) "
+    "ON CONFLICT(guild_id) DO NOTHING"
+)
+
+# PRAGMA user_version once settings.json was imported
+SETTINGS_MIGRATED_VERSION = 1
+
+def _open_settings_db():
+    """Open the settings database, creating it and migrating settings.json until that succeeds"""
+    # Only ever used by one thread at a time, serialized by _settings_write_lock
+    conn = sqlite3.connect(SETTINGS_DB, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_CREATE_SETTINGS_TABLE)
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SETTINGS_MIGRATED_VERSION:
+        return conn
+
+    legacy = _read_legacy_settings()
+    if legacy is None:
+        return conn
+    # The import and its completion marker commit together, so a crash midway retries it
+    with conn:
+        conn.execute("BEGIN")
+        conn.executemany(_MIGRATE_SETTINGS, [
+            (guild_id, *astuple(config)) for guild_id, config in legacy.items()
+        ])
+        conn.execute(f"PRAGMA user_version = {SETTINGS_MIGRATED_VERSION}")
+    if legacy:
+        logger.info(f"Migrated settings for {len(legacy)} guild(s) from {LEGACY_SETTINGS_FILE} to {SETTINGS_DB}")
+    return conn
+
+def _read_settings_db(conn: sqlite3.Connection):
+    """Read every guild's settings into {guild_id: GuildConfig}"""
+    try:
+        rows = conn.execute(f"SELECT guild_id, {_SETTINGS_COLUMNS} FROM guild_settings").fetchall()
+    except sqlite3.Error as e:
         logger.error(f"Failed to load settings: {e}")
         return {}
+    return {guild_id: GuildConfig(*values) for guild_id, *values in rows}
+
+# Opened by open_settings() from setup_hook, so importing the module creates no files
+_settings_db: sqlite3.Connection | None = None
+
+# Settings are read from the database once and served from memory afterwards
+_SETTINGS_CACHE: dict[int, GuildConfig] = {}
+
+async def open_settings():
+    """Open (and if needed migrate) the settings database and load every guild into memory"""
+    global _settings_db
+    _settings_db = await asyncio.to_thread(_open_settings_db)
+    _SETTINGS_CACHE.update(await asyncio.to_thread(_read_settings_db, _settings_db))
+
+def load_settings():
+    """Return the in-memory settings (call mark_settings_dirty after mutating a guild's entry)"""
+    return _SETTINGS_CACHE
+
+def guild_config(settings: dict, guild_id: int) -> GuildConfig:
+    """Return a guild's settings entry, adding an empty one only if it has none yet"""
+    config = settings.get(guild_id)
+    if config is None:
+        # Unlike setdefault(), no throwaway GuildConfig is built for guilds that already have one
+        config = settings[guild_id] = GuildConfig()
+    return config
 
-def save_settings(settings):
-    """Save settings with error handling"""
+SETTINGS_FLUSH_DELAY = 0.1  # Seconds to wait so bursts of changes share one write
+
+# Guilds whose settings changed since the last flush
+_dirty_guilds: set[int] = set()
+_settings_dirty = asyncio.Event()
+_settings_write_lock = asyncio.Lock()
+
+def _write_settings_rows(rows: list[tuple[int, tuple | None]]):
+    """Upsert changed guilds and delete cleared ones in one transaction (blocking, run off the event loop)"""
+    with _settings_db:
+        for guild_id, values in rows:
+            if values is None:
+                _settings_db.execute(_DELETE_SETTINGS, (guild_id,))
+            else:
+                _settings_db.execute(_UPSERT_SETTINGS, (guild_id, *values))
+
+def mark_settings_dirty(guild_id: int):
+    """Schedule a background write after a guild's in-memory settings were changed or removed"""
+    _dirty_guilds.add(guild_id)
+    _settings_dirty.set()
+
+async def flush_settings():
+    """Write the changed guilds' settings to the database in a worker thread"""
+    async with _settings_write_lock:
+        _settings_dirty.clear()
+        if not _dirty_guilds:
+            return
+        guild_ids = list(_dirty_guilds)
+        _dirty_guilds.clear()
+        # Snapshot the values on the event loop; a missing entry means the guild was cleared
+        rows = [
+            (guild_id, astuple(config) if (config := _SETTINGS_CACHE.get(guild_id)) else None)
+            for guild_id in guild_ids
+        ]
+        try:
+            await asyncio.to_thread(_write_settings_rows, rows)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to save settings: {e}")
+            # The transaction was rolled back; retry these guilds on the next flush
+            _dirty_guilds.update(guild_ids)
+
+async def _flush_when_dirty(dirty: asyncio.Event, delay: float, flush):
+    """Background task coalescing changes into as few writes as possible"""
+    while True:
+        await dirty.wait()
+        await asyncio.sleep(delay)
+        await flush()
+
+def _legacy_backup_lines(legacy: dict) -> list[bytes]:
+    """Encode the legacy backup as JSON Lines, skipping invalid guilds and reviews one at a time"""
+    lines = []
+    for guild_id_str, reviews in legacy.items():
+        try:
+            guild_id = int(guild_id_str)
+            review_items = reviews.items()
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Skipping invalid legacy backup guild {guild_id_str!r}: {e}")
+            continue
+        for review_id, review in review_items:
+            if not isinstance(review, dict):
+                logger.warning(f"Skipping invalid legacy backup review {review_id!r} in guild {guild_id}")
+                continue
+            lines.append(_dumps({"guild_id": guild_id, "review_id": review_id, **review}) + b"\n")
+    return lines
+
+def _migrate_legacy_backup():
+    """
+    Merge a backup written in the old single-document format into the JSON Lines file.
+    The legacy file is renamed once merged, so a failed or interrupted migration is retried.
+    """
+    try:
+        with open(LEGACY_BACKUP_FILE, "rb") as f:
+            legacy = _loads(f.read())
+    except FileNotFoundError:
+        return
+    except (ValueError, IOError) as e:
+        logger.error(f"Failed to read legacy backup: {e}")
+        return
+    if not isinstance(legacy, dict):
+        logger.warning("Invalid legacy backup format, skipping migration")
+        return
+    lines = _legacy_backup_lines(legacy)
     try:
-        with open(SETTINGS_FILE, "w", encoding='utf-8') as f:
-            json.dump(settings, f, indent=4)
-    except (IOError, TypeError) as e:
-        logger.error(f"Failed to save settings: {e}")
-        raise
+        # Reviews appended since the failed attempt are kept; duplicates load as one per review id
+        try:
+            with open(BACKUP_FILE, "rb") as f:
+                existing = f.read()
+        except FileNotFoundError:
+            existing = b""
+        if existing and not existing.endswith(b"\n"):
+            existing += b"\n"
+        # Write to a temporary file first so a crash never leaves a partial backup
+        tmp_file = f"{BACKUP_FILE}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.writelines(lines)
+            f.write(existing)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, BACKUP_FILE)
+        os.replace(LEGACY_BACKUP_FILE, f"{LEGACY_BACKUP_FILE}.migrated")
+    except IOError as e:
+        logger.error(f"Failed to migrate legacy backup: {e}")
+        return
+    logger.info(f"Migrated {len(lines)} reviews from {LEGACY_BACKUP_FILE} to {BACKUP_FILE}")
 
-def load_backup():
-    """Load backup with error handling and validation"""
+def _read_backup_file():
+    """Stream the JSON Lines backup into {guild_id: {review_id: review}}"""
+    _migrate_legacy_backup()
+    backup = {}
     try:
-        if not os.path.exists(BACKUP_FILE):
-            return {}
-        with open(BACKUP_FILE, "r", encoding='utf-8') as f:
-            backup = json.load(f)
-            # Validate backup structure
-            if not isinstance(backup, dict):
-                logger.warning("Invalid backup format, resetting to empty dict")
-                return {}
-            return backup
-    except (json.JSONDecodeError, IOError) as e:
+        line = b""
+        with open(BACKUP_FILE, "rb") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    review = _loads(line)
+                    guild_id = int(review.pop("guild_id"))
+                    review_id = review.pop("review_id")
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    # A crash mid-append can leave a torn line; skip it rather than the whole file
+                    logger.warning(f"Skipping invalid backup line {line_number}: {e}")
+                    continue
+                backup.setdefault(guild_id, {})[review_id] = review
+        if line and not line.endswith(b"\n"):
+            # Terminate a torn last line so the next append starts on a line of its own
+            with open(BACKUP_FILE, "ab") as f:
+                f.write(b"\n")
+        return backup
+    except FileNotFoundError:
+        return backup
+    except IOError as e:
+        # Nothing is lost on disk: the file is append-only, new reviews are still added to it
         logger.error(f"Failed to load backup: {e}")
-        return {}
+        return backup
 
-def save_backup(backup):
-    """Save backup with error handling"""
-    try:
-        with open(BACKUP_FILE, "w", encoding='utf-8') as f:
-            json.dump(backup, f, indent=4)
-    except (IOError, TypeError) as e:
-        logger.error(f"Failed to save backup: {e}")
-        # Don't raise here - we don't want to break the review process
+# Backup is read from disk once, by open_backup() from setup_hook, and kept in memory afterwards
+_BACKUP_CACHE: dict[int, dict[str, dict]] = {}
+
+async def open_backup():
+    """Migrate the legacy backup if needed and load every review into memory"""
+    _BACKUP_CACHE.update(await asyncio.to_thread(_read_backup_file))
+
+BACKUP_FLUSH_DELAY = 1.0  # Reviews arriving within this window share one write
+
+# Encoded backup lines waiting to be appended to BACKUP_FILE
+_pending_backup_lines: list[bytes] = []
+_backup_dirty = asyncio.Event()
+_backup_write_lock = asyncio.Lock()
+
+def load_backup():
+    """Return the in-memory backup (new reviews must be added with append_backup)"""
+    return _BACKUP_CACHE
+
+def _append_backup_lines(lines: list[bytes]):
+    """Append encoded reviews to the backup file (blocking, run off the event loop)"""
+    with open(BACKUP_FILE, "ab") as f:
+        f.writelines(lines)
+        # One fsync per batch rather than per review
+        f.flush()
+        os.fsync(f.fileno())
+
+def append_backup(guild_id: int, review_id: str, review: dict):
+    """Add a review to the in-memory backup and queue it for appending to disk"""
+    _BACKUP_CACHE.setdefault(guild_id, {})[review_id] = review
+    _pending_backup_lines.append(_dumps({"guild_id": guild_id, "review_id": review_id, **review}) + b"\n")
+    _backup_dirty.set()
+
+async def flush_backup():
+    """Append queued reviews to the backup file in a worker thread"""
+    async with _backup_write_lock:
+        _backup_dirty.clear()
+        if not _pending_backup_lines:
+            return
+        lines = _pending_backup_lines[:]
+        _pending_backup_lines.clear()
+        try:
+            await asyncio.to_thread(_append_backup_lines, lines)
+        except IOError as e:
+            logger.error(f"Failed to save backup: {e}")
+            # Keep the lines for the next flush; a review written twice loads as one since
+            # it's keyed by its review id
+            _pending_backup_lines[:0] = lines
+
+def _backup_stats(reviews: list) -> tuple[int, int, int]:
+    """Return (valid reviews, unique reviewers, unique staff reviewed) for a guild's reviews"""
+    valid = [r for r in reviews if isinstance(r, dict) and "reviewer_id" in r and "reviewed_id" in r]
+    return len(valid), len({r["reviewer_id"] for r in valid}), len({r["reviewed_id"] for r in valid})
 
 def backup_review(guild_id: int, reviewer_id: int, reviewed_id: int, review_content: str, timestamp: datetime):
     """Save a review to the backup file with a unique ID"""
     try:
-        backup = load_backup()
-        guild_id_str = str(guild_id)
-        
-        if guild_id_str not in backup:
-            backup[guild_id_str] = {}
-        
         # Generate unique ID
-        review_id = str(uuid.uuid4())
+        review_id = uuid.uuid4().hex
         
         # Sanitize content for backup
         sanitized_content, _ = sanitize_content(review_content)
         
         # Store review data with validation
-        backup[guild_id_str][review_id] = {
+        append_backup(int(guild_id), review_id, {
             "reviewer_id": int(reviewer_id),
             "reviewed_id": int(reviewed_id), 
             "content": sanitized_content,
-            "timestamp": timestamp.isoformat(),
-            "created_at": datetime.now().isoformat()
-        }
-        
-        save_backup(backup)
+            # Unix timestamps: unambiguous (timezone-aware), compact, cheap to serialize
+            "timestamp": timestamp.timestamp(),
+            "created_at": time.time()
+        })
         return review_id
     except Exception as e:
         logger.error(f"Failed to backup review: {e}")
         return None
 
+# Static parts of the testimonial embed; per-review values are merged in by build_review_embed
+_REVIEW_EMBED_TEMPLATE = {
+    "type": "rich",
+    "author": {"name": "New Review!"},
+    "fields": ({"name": "Reviewer", "inline": True}, {"name": "Reviewed", "inline": True}),
+}
+
+def build_review_embed(reviewer: discord.Member, target_user: discord.Member, content: str, review_id: str | None, created_at: datetime) -> discord.Embed:
+    """Build the testimonial embed from the template in a single from_dict call"""
+    reviewer_field, reviewed_field = _REVIEW_EMBED_TEMPLATE["fields"]
+    # from_dict keeps references to nested dicts, so each one is a fresh copy of the template
+    return discord.Embed.from_dict({
+        **_REVIEW_EMBED_TEMPLATE,
+        "title": f"Testimonial for {target_user.display_name} <a:kv7_wave:1285921863901646849>",
+        "description": content,
+        "color": discord.Color.random().value,
+        "timestamp": created_at.isoformat(),
+        "author": {**_REVIEW_EMBED_TEMPLATE["author"], "icon_url": reviewer.display_avatar.url},
+        "thumbnail": {"url": target_user.display_avatar.url},
+        "fields": [
+            {**reviewer_field, "value": f"{reviewer.mention} (`{reviewer.name}`)"},
+            {**reviewed_field, "value": f"{target_user.mention} (`{target_user.name}`)"},
+        ],
+        "footer": {"text": f"ID: {review_id} • Submitted" if review_id else "Submitted"},
+    })
+
 class ReviewModal(discord.ui.Modal, title="Leave a Review"):
+    __slots__ = ("target_user", "testimonial_channel_id", "reward_role_id", "review_input")
+
     def __init__(self, target_user: discord.User, testimonial_channel_id: int, reward_role_id: int = None):
         super().__init__()
         self.target_user = target_user
@@ -188,39 +565,18 @@ class ReviewModal(discord.ui.Modal, title="Leave a Review"):
             else:
                 logger.error("Failed to backup review, but continuing with posting")
 
-            embed = discord.Embed(
-                title=f"Testimonial for {self.target_user.display_name} <a:kv7_wave:1285921863901646849>",
-                description=sanitized_content,
-                color=discord.Color.random(),
-                timestamp=interaction.created_at
-            )
-            embed.set_author(name=f"New Review!", icon_url=interaction.user.display_avatar.url)
-            embed.set_thumbnail(url=self.target_user.display_avatar.url)
-            embed.add_field(
-                name="Reviewer",
-                value=f"{interaction.user.mention} (`{interaction.user.name}`)",
-                inline=True
-            )
-            embed.add_field(
-                name="Reviewed",
-                value=f"{self.target_user.mention} (`{self.target_user.name}`)",
-                inline=True
-            )
-            
-            if review_id:
-                embed.set_footer(text=f"ID: {review_id} • Submitted")
-            else:
-                embed.set_footer(text="Submitted")
+            embed = build_review_embed(interaction.user, self.target_user, sanitized_content, review_id, interaction.created_at)
 
             channel = interaction.guild.get_channel(self.testimonial_channel_id)
             if not channel:
                 await interaction.response.send_message("❌ Testimonial channel not found. Please contact an administrator.", ephemeral=True)
                 return
                 
-            if not channel.permissions_for(interaction.guild.me).send_messages:
+            if not _can_send(channel, interaction.guild.me):
                 await interaction.response.send_message("❌ I don't have permission to send messages in the testimonial channel.", ephemeral=True)
                 return
 
+            await _SEND_LIMITER.acquire()
             await channel.send(embed=embed)
             
             role_message = ""
@@ -229,7 +585,8 @@ class ReviewModal(discord.ui.Modal, title="Leave a Review"):
                     reward_role = interaction.guild.get_role(self.reward_role_id)
                     if not reward_role:
                         role_message = " (Reward role no longer exists)"
-                    elif reward_role in interaction.user.roles:
+                    # Member.roles builds and sorts a list of every role; test the one id instead
+                    elif interaction.user.get_role(reward_role.id) is not None:
                         role_message = f" (You already have the {reward_role.name} role)"
                     else:
                         await interaction.user.add_roles(reward_role, reason="Left a review")
@@ -246,27 +603,85 @@ class ReviewModal(discord.ui.Modal, title="Leave a Review"):
             pass
         except discord.Forbidden as e:
             logger.error(f"Permission error in review submission: {e}")
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message("❌ I don't have the necessary permissions to complete this action. Please contact an administrator.", ephemeral=True)
-            except:
-                pass
+            await _err_safely(interaction, "I don't have the necessary permissions to complete this action. Please contact an administrator.")
         except discord.HTTPException as e:
             logger.error(f"Discord API error in review submission: {e}")
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(f"❌ Discord API error: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
-            except:
-                pass
+            await _err_safely(interaction, f"Discord API error: {_truncate_err(e)}")
         except Exception as e:
             logger.error(f"Unexpected error in review submission: {e}")
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(f"❌ An unexpected error occurred: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
-            except:
-                pass
+            await _err_safely(interaction, f"An unexpected error occurred: {_truncate_err(e)}")
+
+MAX_SELECT_OPTIONS = 25  # Discord select menu limit
+OPTIONS_CACHE_TTL = 60  # Seconds a computed option list is reused
+
+# guild_id -> role_id -> (expires_at, select options); nested so a guild is dropped in one pop
+_options_cache: dict[int, dict[int | None, tuple[float, list[discord.SelectOption]]]] = {}
+
+def invalidate_options_cache(guild_id: int):
+    """Drop every cached option list for a guild after its members or roles change"""
+    _options_cache.pop(guild_id, None)
+
+SEND_MESSAGES_FLAG = discord.Permissions.send_messages.flag
+
+def _can_send(channel: discord.abc.GuildChannel, me: discord.Member) -> bool:
+    """Whether me may send messages in channel, tested on the raw permission bits"""
+    return bool(channel.permissions_for(me).value & SEND_MESSAGES_FLAG)
+
+# Members holding any of these permissions count as staff when no reviewable role is set
+STAFF_PERMISSIONS_MASK = (
+    discord.Permissions.kick_members.flag |
+    discord.Permissions.manage_messages.flag |
+    discord.Permissions.manage_roles.flag
+)
+
+def _iter_reviewable_members(guild: discord.Guild, role_id: int = None):
+    """Lazily yield members that can be reviewed, without building intermediate lists"""
+    if role_id and not guild.get_role(role_id):
+        return
+
+    # guild.me is a member lookup; resolve it once rather than per member
+    me_id = guild.me.id
+    # Role.members filters the whole guild up front, so test membership per member instead
+    # and let the caller stop consuming as soon as it has enough
+    for m in guild.members:
+        if m.bot or m.id == me_id:
+            continue
+        if role_id:
+            if m.get_role(role_id) is None:
+                continue
+        # Limit to members with certain permissions to avoid spam targets;
+        # guild_permissions is recomputed on every access, read it once and test the bits together
+        elif not m.guild_permissions.value & STAFF_PERMISSIONS_MASK:
+            continue
+        yield m
+
+def get_review_options(guild: discord.Guild, role_id: int = None) -> list[discord.SelectOption]:
+    """Return select options for up to MAX_SELECT_OPTIONS reviewable members, cached per guild and role"""
+    guild_options = _options_cache.get(guild.id)
+    now = time.monotonic()
+    cached = guild_options.get(role_id) if guild_options else None
+    if cached and cached[0] > now:
+        _metrics["options_cache.hit"] += 1
+        return cached[1]
+    _metrics["options_cache.miss"] += 1
+
+    # Stop scanning as soon as the select menu is full
+    select_option = discord.SelectOption
+    options = []
+    for m in islice(_iter_reviewable_members(guild, role_id), MAX_SELECT_OPTIONS):
+        # display_name is a property; read it once per member
+        display_name, name = m.display_name, m.name
+        options.append(select_option(
+            label=display_name[:100],  # Prevent label overflow
+            value=str(m.id),
+            description=f"@{name}"[:100] if name != display_name else None
+        ))
+    _options_cache.setdefault(guild.id, {})[role_id] = (now + OPTIONS_CACHE_TTL, options)
+    return options
 
 class UserSelectView(discord.ui.View):
+    __slots__ = ("testimonial_channel_id", "guild", "role_id", "reward_role_id")
+
     def __init__(self, testimonial_channel_id: int, guild: discord.Guild, role_id: int = None, reward_role_id: int = None):
         super().__init__(timeout=60)
         self.testimonial_channel_id = testimonial_channel_id
@@ -276,33 +691,15 @@ class UserSelectView(discord.ui.View):
 
         try:
             # Get members to review with better filtering
-            if role_id:
-                role = guild.get_role(role_id)
-                members = [m for m in role.members if not m.bot and m.id != guild.me.id] if role else []
-            else:
-                # Limit to members with certain permissions to avoid spam targets
-                members = [m for m in guild.members if not m.bot and m.id != guild.me.id and (
-                    m.guild_permissions.kick_members or 
-                    m.guild_permissions.manage_messages or 
-                    m.guild_permissions.manage_roles
-                )]
-
-            # Limit the number of options to prevent Discord API limits
-            members = members[:25]  # Discord select menu limit
-
-            if members:
-                options = [
-                    discord.SelectOption(
-                        label=m.display_name[:100],  # Prevent label overflow
-                        value=str(m.id),
-                        description=f"@{m.name}"[:100] if m.name != m.display_name else None
-                    ) for m in members
-                ]
+            options = get_review_options(guild, role_id)
+
+            if options:
                 select = discord.ui.Select(
                     placeholder="Select a staff member to review",
                     min_values=1,
                     max_values=1,
-                    options=options,
+                    # Slicing copies the cached list (Select keeps a reference) and enforces Discord's limit
+                    options=options[:MAX_SELECT_OPTIONS],
                     custom_id="user_select_filtered"
                 )
                 select.callback = self.select_user
@@ -344,19 +741,20 @@ class UserSelectView(discord.ui.View):
             
         except (ValueError, KeyError) as e:
             logger.error(f"Data error in select_user: {e}")
-            await interaction.response.send_message(f"❌ Data validation error: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
+            await _err_safely(interaction, f"Data validation error: {_truncate_err(e)}")
         except discord.NotFound as e:
             logger.error(f"Discord object not found in select_user: {e}")
-            await interaction.response.send_message("❌ The selected user or channel could not be found. Please try again.", ephemeral=True)
+            await _err_safely(interaction, "The selected user or channel could not be found. Please try again.")
         except discord.Forbidden as e:
             logger.error(f"Permission error in select_user: {e}")
-            await interaction.response.send_message("❌ I don't have permission to perform this action. Please contact an administrator.", ephemeral=True)
+            await _err_safely(interaction, "I don't have permission to perform this action. Please contact an administrator.")
         except Exception as e:
             logger.error(f"Unexpected error in select_user: {e}")
-            if not interaction.response.is_done():
-                await interaction.response.send_message(f"❌ Unexpected error: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
+            await _err_safely(interaction, f"Unexpected error: {_truncate_err(e)}")
 
 class ReviewButtonView(discord.ui.View):
+    __slots__ = ("testimonial_channel_id", "role_id", "reward_role_id")
+
     def __init__(self, testimonial_channel_id: int, role_id: int | None = None, reward_role_id: int | None = None):
         super().__init__(timeout=None)
         self.testimonial_channel_id = testimonial_channel_id
@@ -387,25 +785,133 @@ class ReviewButtonView(discord.ui.View):
             )
         except discord.Forbidden as e:
             logger.error(f"Permission error in review_button: {e}")
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message("❌ I don't have the necessary permissions. Please contact an administrator.", ephemeral=True)
-            except:
-                pass
+            await _err_safely(interaction, "I don't have the necessary permissions. Please contact an administrator.")
         except discord.HTTPException as e:
             logger.error(f"Discord API error in review_button: {e}")
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(f"❌ Discord API error: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
-            except:
-                pass
+            await _err_safely(interaction, f"Discord API error: {_truncate_err(e)}")
         except Exception as e:
             logger.error(f"Unexpected error in review_button: {e}")
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(f"❌ Unexpected error: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
-            except:
-                pass
+            await _err_safely(interaction, f"Unexpected error: {_truncate_err(e)}")
+
+# (guild_id, testimonial_channel_id, role_id, reward_role_id) -> persistent view
+_view_cache: dict[tuple, ReviewButtonView] = {}
+
+def get_review_view(guild_id: int, testimonial_channel_id: int, role_id: int | None = None, reward_role_id: int | None = None) -> ReviewButtonView:
+    """Return the shared persistent review view for a guild configuration"""
+    key = (guild_id, testimonial_channel_id, role_id, reward_role_id)
+    view = _view_cache.get(key)
+    if view is None:
+        view = _view_cache[key] = ReviewButtonView(testimonial_channel_id, role_id, reward_role_id)
+    return view
+
+class SlidingWindowLimiter:
+    """Proactively spaces out requests so at most `limit` start within any `period` seconds"""
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self._sent = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            while self._sent and now - self._sent[0] >= self.period:
+                self._sent.popleft()
+            if len(self._sent) >= self.limit:
+                # Wait for the oldest request to leave the window
+                await asyncio.sleep(self.period - (now - self._sent.popleft()))
+            self._sent.append(time.monotonic())
+
+# Discord's global limit is 50 requests per second per bot
+_SEND_LIMITER = SlidingWindowLimiter(limit=50, period=1.0)
+
+SEND_RETRY_ATTEMPTS = 3
+SEND_RETRY_BASE_DELAY = 0.5  # Seconds, doubled after every rate-limited attempt
+
+async def _retry_send(send, attempts: int = SEND_RETRY_ATTEMPTS, base_delay: float = SEND_RETRY_BASE_DELAY):
+    """Await send(), retrying with exponential backoff and jitter while Discord rate limits us"""
+    for attempt in range(attempts):
+        await _SEND_LIMITER.acquire()
+        try:
+            return await send()
+        # discord.py already reads X-RateLimit-Remaining/Reset-After for every bucket and waits
+        # before a request would be rejected, so only retry what gets past that
+        except discord.HTTPException as e:
+            # A 429 here means discord.py's own retries were exhausted
+            if e.status != 429 or attempt == attempts - 1:
+                raise
+            delay = base_delay * 2 ** attempt + random.uniform(0, 0.25)
+            # discord.py's internal rate limit waits aren't counted here
+            _metrics["send.retries_after_429"] += 1
+            logger.warning(f"Rate limited, retrying in {delay:.2f}s (attempt {attempt + 1}/{attempts})")
+            await asyncio.sleep(delay)
+
+def attach_review_view(client: commands.Bot, guild_id: int, config: GuildConfig):
+    """Register the persistent view for a guild's posted review message using its current settings"""
+    view = get_review_view(guild_id, config.testimonial_channel, config.reviewable_role, config.reward_role)
+    client.add_view(view, message_id=config.review_message_id)
+
+async def post_review_message(settings: dict, guild_id: int, channel: discord.TextChannel) -> discord.Message:
+    """Post the review prompt in channel and save its message id for setup_hook to reattach"""
+    config = settings[guild_id]
+    view = get_review_view(guild_id, config.testimonial_channel, config.reviewable_role, config.reward_role)
+    # channel.send() registers the persistent view for the new message, no add_view needed
+    message = await _retry_send(lambda: channel.send(embed=REVIEW_EMBED, view=view))
+    config.review_message_id = message.id
+    mark_settings_dirty(guild_id)
+    return message
+
+def _command_tree_hash(tree: app_commands.CommandTree, application_id: int) -> str:
+    """Return a content hash of the commands registered on tree for one application"""
+    # Keyed by application so switching the bot to another one still syncs its commands
+    payload = json.dumps({
+        "application_id": application_id,
+        "commands": [command.to_dict(tree) for command in tree.get_commands()],
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _read_command_hash():
+    """Return the hash of the last synced command tree, or None if it was never synced"""
+    try:
+        with open(COMMAND_HASH_FILE, encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+    except IOError as e:
+        logger.error(f"Failed to read command hash: {e}")
+        return None
+
+def _write_command_hash(command_hash: str):
+    """Remember the hash of the command tree that was just synced"""
+    try:
+        with open(COMMAND_HASH_FILE, "w", encoding="utf-8") as f:
+            f.write(command_hash)
+    except IOError as e:
+        # Only costs a redundant sync on the next start
+        logger.error(f"Failed to save command hash: {e}")
+
+def _format_metrics(metrics: Counter) -> str:
+    """Render the counters as key=value pairs, turning command time totals into averages"""
+    parts = []
+    for key, value in sorted(metrics.items()):
+        if key.endswith(".seconds"):
+            name = key.removesuffix(".seconds")
+            parts.append(f"{name}.avg_ms={value / metrics[f'{name}.count'] * 1000:.0f}")
+        else:
+            parts.append(f"{key}={value}")
+    return ", ".join(parts)
+
+def _log_metrics():
+    """Log the counters collected since startup"""
+    if _metrics:
+        logger.info(f"Metrics: {_format_metrics(_metrics)}")
+
+async def _log_metrics_periodically(interval: float):
+    """Background task logging the running counters"""
+    while True:
+        await asyncio.sleep(interval)
+        _log_metrics()
 
 class ReviewBot(commands.Bot):
     def __init__(self):
@@ -413,26 +919,85 @@ class ReviewBot(commands.Bot):
         intents.message_content = False
         intents.members = True
         super().__init__(command_prefix=None, intents=intents)
+        self.background_tasks = []
 
     async def setup_hook(self):
-        settings = load_settings()
-        for guild_id_str, data in settings.items():
-            testimonial_channel_id = data.get("testimonial_channel")
-            role_id = data.get("reviewable_role")
-            reward_role_id = data.get("reward_role")
-            review_message_id = data.get("review_message_id")
+        await open_settings()
+        await open_backup()
 
-            if testimonial_channel_id and review_message_id:
-                try:
-                    view = ReviewButtonView(testimonial_channel_id, role_id, reward_role_id)
-                    self.add_view(view, message_id=review_message_id)
-                    logger.info(f"Reattached persistent view to message {review_message_id} in guild {guild_id_str}")
-                except Exception as e:
-                    logger.error(f"Failed to reattach view for guild {guild_id_str}: {e}")
+        self.background_tasks = [
+            asyncio.create_task(_flush_when_dirty(_settings_dirty, SETTINGS_FLUSH_DELAY, flush_settings)),
+            asyncio.create_task(_flush_when_dirty(_backup_dirty, BACKUP_FLUSH_DELAY, flush_backup)),
+            asyncio.create_task(_log_metrics_periodically(METRICS_LOG_INTERVAL)),
+        ]
+
+        # Skip incomplete guild entries before building any views
+        pending = [
+            (guild_id, config)
+            for guild_id, config in load_settings().items()
+            if config.has_review_message
+        ]
+
+        reattached = 0
+        for guild_id, config in pending:
+            try:
+                attach_review_view(self, guild_id, config)
+                reattached += 1
+            except Exception as e:
+                logger.error(f"Failed to reattach view for guild {guild_id}: {e}")
+        logger.info(f"Reattached {reattached} persistent review view(s)")
+
+        # setup_hook runs once per process, unlike on_ready which fires again on every reconnect;
+        # the global sync is a slow round-trip, so only do it when the commands changed
+        command_hash = _command_tree_hash(self.tree, self.application_id)
+        if command_hash != _read_command_hash():
+            try:
+                await self.tree.sync()
+            except discord.HTTPException as e:
+                # Don't keep the bot from starting; the hash stays unwritten so the next start retries
+                logger.error(f"Failed to sync application commands: {e}")
+            else:
+                _write_command_hash(command_hash)
+                logger.info("Synced application commands")
+        else:
+            logger.info("Application commands unchanged, skipping sync")
 
     async def on_ready(self):
         logger.info(f"✅ Logged in as {self.user} (ID: {self.user.id})")
-        await self.tree.sync()
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command: app_commands.Command):
+        # Measured from the interaction's creation, so it includes the gateway delivery time
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        _metrics[f"commands.{command.name}.count"] += 1
+        _metrics[f"commands.{command.name}.seconds"] += elapsed
+
+    # Member and role changes can alter who appears in the staff select menu
+    async def on_member_join(self, member: discord.Member):
+        invalidate_options_cache(member.guild.id)
+
+    async def on_member_remove(self, member: discord.Member):
+        invalidate_options_cache(member.guild.id)
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        invalidate_options_cache(after.guild.id)
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        invalidate_options_cache(after.guild.id)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        invalidate_options_cache(role.guild.id)
+
+    async def close(self):
+        # Stop the gateway first so no event can mark changes dirty after the final flush
+        await super().close()
+        # Make sure pending changes reach the disk before shutting down
+        await flush_settings()
+        await flush_backup()
+        for task in self.background_tasks:
+            task.cancel()
+        if _settings_db is not None:
+            _settings_db.close()
+        _log_metrics()
 
 bot = ReviewBot()
 
@@ -441,28 +1006,14 @@ bot = ReviewBot()
 async def backup_info(interaction: discord.Interaction):
     """Show information about backed up reviews"""
     try:
-        backup = load_backup()
-        guild_id_str = str(interaction.guild.id)
+        reviews = load_backup().get(interaction.guild.id)
         
-        if guild_id_str not in backup or not backup[guild_id_str]:
+        if not reviews:
             await interaction.response.send_message("📦 No reviews backed up for this server.", ephemeral=True)
             return
         
-        review_count = len(backup[guild_id_str])
-        
-        # Get some basic stats with error handling
-        reviewers = set()
-        reviewed = set()
-        valid_reviews = 0
-        
-        for review_id, review_data in backup[guild_id_str].items():
-            try:
-                if isinstance(review_data, dict) and "reviewer_id" in review_data and "reviewed_id" in review_data:
-                    reviewers.add(review_data["reviewer_id"])
-                    reviewed.add(review_data["reviewed_id"])
-                    valid_reviews += 1
-            except Exception as e:
-                logger.warning(f"Invalid review data for ID {review_id}: {e}")
+        # Count off the event loop; list() snapshots the reviews so new submissions can't race it
+        valid_reviews, reviewer_count, reviewed_count = await asyncio.to_thread(_backup_stats, list(reviews.values()))
         
         embed = discord.Embed(
             title="📦 Review Backup Information",
@@ -470,21 +1021,21 @@ async def backup_info(interaction: discord.Interaction):
             timestamp=interaction.created_at
         )
         embed.add_field(name="Total Reviews Backed Up", value=str(valid_reviews), inline=True)
-        embed.add_field(name="Unique Reviewers", value=str(len(reviewers)), inline=True)
-        embed.add_field(name="Unique Staff Reviewed", value=str(len(reviewed)), inline=True)
+        embed.add_field(name="Unique Reviewers", value=str(reviewer_count), inline=True)
+        embed.add_field(name="Unique Staff Reviewed", value=str(reviewed_count), inline=True)
         embed.set_footer(text="Backup system active")
         
         await interaction.response.send_message(embed=embed, ephemeral=True)
         
-    except FileNotFoundError as e:
-        logger.error(f"File not found in backup_info command: {e}")
-        await interaction.response.send_message("❌ Backup file not found. No reviews have been backed up yet.", ephemeral=True)
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON decode error in backup_info command: {e}")
-        await interaction.response.send_message("❌ Backup file is corrupted. Please contact an administrator.", ephemeral=True)
     except Exception as e:
         logger.error(f"Unexpected error in backup_info command: {e}")
-        await interaction.response.send_message(f"❌ Unexpected error while retrieving backup info: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
+        await _err(interaction, f"Unexpected error while retrieving backup info: {_truncate_err(e)}")
+
+# Checked in order by _report_error: (log prefix, reply), None replies with the error itself
+_SETTINGS_ERRORS = {
+    discord.Forbidden: ("Permission error", "I don't have permission to perform this action. Please check my permissions."),
+    discord.HTTPException: ("Discord API error", None),
+}
 
 @bot.tree.command(name="settings", description="Manage settings")
 @discord.app_commands.default_permissions(administrator=True)
@@ -500,46 +1051,42 @@ async def backup_info(interaction: discord.Interaction):
 async def settings_command(interaction: discord.Interaction, action: app_commands.Choice[str], channel: discord.TextChannel = None, role: discord.Role = None):
     try:
         settings = load_settings()
-        guild_id = str(interaction.guild.id)
+        guild_id = interaction.guild.id
 
         if action.value == "set_review_channel":
+            # Posting the embed may wait on rate limit backoff; acknowledge within Discord's
+            # 3 second window and answer everything below via followups
+            await interaction.response.defer(ephemeral=True)
+
             if channel is None:
-                await interaction.response.send_message("❌ Please provide a channel.", ephemeral=True)
+                await _err(interaction, "Please provide a channel.")
                 return
 
             # Validate bot permissions in the channel
-            if not channel.permissions_for(interaction.guild.me).send_messages:
-                await interaction.response.send_message("❌ I don't have permission to send messages in that channel.", ephemeral=True)
+            if not _can_send(channel, interaction.guild.me):
+                await _err(interaction, "I don't have permission to send messages in that channel.")
                 return
 
-            if guild_id not in settings:
-                settings[guild_id] = {}
-
-            settings[guild_id]["review_channel"] = channel.id
-            save_settings(settings)
+            config = guild_config(settings, guild_id)
+            config.review_channel = channel.id
+            # Saved even if posting the embed below fails
+            mark_settings_dirty(guild_id)
 
-            testimonial_id = settings[guild_id].get("testimonial_channel")
-            role_id = settings[guild_id].get("reviewable_role")
-            reward_role_id = settings[guild_id].get("reward_role")
+            testimonial_id = config.testimonial_channel
 
-            if testimonial_id:
-                # Validate testimonial channel still exists
-                testimonial_channel = interaction.guild.get_channel(testimonial_id)
-                if not testimonial_channel:
-                    await interaction.response.send_message(f"⚠️ Review channel set to {channel.mention}, but testimonial channel is invalid. Please reconfigure.", ephemeral=True)
-                    return
+            if not testimonial_id:
+                await _ok(interaction, f"Review channel set to {channel.mention}, but testimonial channel not set yet.")
+                return
 
-                embed = discord.Embed(title="💬 Leave a Review", description="Click the button below to submit your testimonial.", color=discord.Color.blurple())
-                view = ReviewButtonView(testimonial_id, role_id, reward_role_id)
-                message = await channel.send(embed=embed, view=view)
-                settings[guild_id]["review_message_id"] = message.id
-                save_settings(settings)
+            # Validate testimonial channel still exists
+            testimonial_channel = interaction.guild.get_channel(testimonial_id)
+            if not testimonial_channel:
+                await _respond(interaction, f"⚠️ Review channel set to {channel.mention}, but testimonial channel is invalid. Please reconfigure.")
+                return
 
-                bot.add_view(ReviewButtonView(testimonial_id, role_id, reward_role_id), message_id=message.id)
+            await post_review_message(settings, guild_id, channel)
 
-                await interaction.response.send_message(f"✅ Review channel set to {channel.mention} and embed posted.", ephemeral=True)
-            else:
-                await interaction.response.send_message(f"✅ Review channel set to {channel.mention}, but testimonial channel not set yet.", ephemeral=True)
+            await _ok(interaction, f"Review channel set to {channel.mention} and embed posted.")
 
         elif action.value == "set_testimonial_channel":
             if channel is None:
@@ -547,14 +1094,16 @@ async def settings_command(interaction: discord.Interaction, action: app_command
                 return
                 
             # Validate bot permissions in the channel
-            if not channel.permissions_for(interaction.guild.me).send_messages:
+            if not _can_send(channel, interaction.guild.me):
                 await interaction.response.send_message("❌ I don't have permission to send messages in that channel.", ephemeral=True)
                 return
                 
-            if guild_id not in settings:
-                settings[guild_id] = {}
-            settings[guild_id]["testimonial_channel"] = channel.id
-            save_settings(settings)
+            config = guild_config(settings, guild_id)
+            config.testimonial_channel = channel.id
+            mark_settings_dirty(guild_id)
+            if config.has_review_message:
+                # Point the already posted review button at the new settings
+                attach_review_view(bot, guild_id, config)
             await interaction.response.send_message(f"✅ Testimonial channel set to {channel.mention}.", ephemeral=True)
 
         elif action.value == "set_reviewable_role":
@@ -571,10 +1120,12 @@ async def settings_command(interaction: discord.Interaction, action: app_command
                 await interaction.response.send_message("❌ Cannot use bot-managed roles.", ephemeral=True)
                 return
                 
-            if guild_id not in settings:
-                settings[guild_id] = {}
-            settings[guild_id]["reviewable_role"] = role.id
-            save_settings(settings)
+            config = guild_config(settings, guild_id)
+            config.reviewable_role = role.id
+            mark_settings_dirty(guild_id)
+            if config.has_review_message:
+                # Point the already posted review button at the new settings
+                attach_review_view(bot, guild_id, config)
             await interaction.response.send_message(f"✅ Reviewable role set to {role.name}.", ephemeral=True)
 
         elif action.value == "set_reward_role":
@@ -595,130 +1146,105 @@ async def settings_command(interaction: discord.Interaction, action: app_command
                 await interaction.response.send_message("❌ Role is higher than my highest role. Please move my role higher or choose a lower role.", ephemeral=True)
                 return
                 
-            if guild_id not in settings:
-                settings[guild_id] = {}
-            settings[guild_id]["reward_role"] = role.id
-            save_settings(settings)
+            config = guild_config(settings, guild_id)
+            config.reward_role = role.id
+            mark_settings_dirty(guild_id)
+            if config.has_review_message:
+                # Point the already posted review button at the new settings
+                attach_review_view(bot, guild_id, config)
             await interaction.response.send_message(f"✅ Reward role set to {role.name}. Users will receive this role after leaving a review.", ephemeral=True)
 
         elif action.value == "clear":
             settings.pop(guild_id, None)
-            save_settings(settings)
+            mark_settings_dirty(guild_id)
             await interaction.response.send_message("✅ Settings cleared.", ephemeral=True)
 
         elif action.value == "list":
-            current_review = settings.get(guild_id, {}).get("review_channel")
-            current_testimonial = settings.get(guild_id, {}).get("testimonial_channel")
-            current_role = settings.get(guild_id, {}).get("reviewable_role")
-            current_reward_role = settings.get(guild_id, {}).get("reward_role")
+            config = settings.get(guild_id)
+            if config is None:
+                current_review = current_testimonial = current_role = current_reward_role = None
+            else:
+                current_review = config.review_channel
+                current_testimonial = config.testimonial_channel
+                current_role = config.reviewable_role
+                current_reward_role = config.reward_role
 
             embed = discord.Embed(title="⚙️ Current Settings", color=discord.Color.blue())
             
-            # Validate channels and roles still exist
-            review_channel = interaction.guild.get_channel(current_review) if current_review else None
-            testimonial_channel = interaction.guild.get_channel(current_testimonial) if current_testimonial else None
-            reviewable_role = interaction.guild.get_role(current_role) if current_role else None
-            reward_role = interaction.guild.get_role(current_reward_role) if current_reward_role else None
+            # Validate channels and roles still exist, resolving each id exactly once
+            get_channel = interaction.guild.get_channel
+            get_role = interaction.guild.get_role
+            review_channel = get_channel(current_review) if current_review else None
+            testimonial_channel = get_channel(current_testimonial) if current_testimonial else None
+            reviewable_role = get_role(current_role) if current_role else None
+            reward_role = get_role(current_reward_role) if current_reward_role else None
             
-            embed.add_field(
-                name="💬 Review Channel", 
-                value=review_channel.mention if review_channel else "Not set or invalid", 
-                inline=False
-            )
-            embed.add_field(
-                name="📝 Testimonial Channel", 
-                value=testimonial_channel.mention if testimonial_channel else "Not set or invalid", 
-                inline=False
-            )
-            embed.add_field(
-                name="👤 Staff Role", 
-                value=reviewable_role.mention if reviewable_role else "Not set or invalid", 
-                inline=False
-            )
-            embed.add_field(
-                name="🎁 Reward Role", 
-                value=reward_role.mention if reward_role else "Not set or invalid", 
-                inline=False
-            )
+            for name, target in (
+                ("💬 Review Channel", review_channel),
+                ("📝 Testimonial Channel", testimonial_channel),
+                ("👤 Staff Role", reviewable_role),
+                ("🎁 Reward Role", reward_role),
+            ):
+                embed.add_field(name=name, value=target.mention if target else "Not set or invalid", inline=False)
 
             await interaction.response.send_message(embed=embed, ephemeral=True)
             
-    except FileNotFoundError as e:
-        logger.error(f"Settings file not found: {e}")
-        await interaction.response.send_message("❌ Settings file not found. Please try setting up the bot again.", ephemeral=True)
-    except json.JSONDecodeError as e:
-        logger.error(f"Settings file corrupted: {e}")
-        await interaction.response.send_message("❌ Settings file is corrupted. Please clear settings and reconfigure.", ephemeral=True)
-    except discord.Forbidden as e:
-        logger.error(f"Permission error in settings command: {e}")
-        await interaction.response.send_message("❌ I don't have permission to perform this action. Please check my permissions.", ephemeral=True)
-    except discord.HTTPException as e:
-        logger.error(f"Discord API error in settings command: {e}")
-        await interaction.response.send_message(f"❌ Discord API error: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
     except Exception as e:
-        logger.error(f"Unexpected error in settings command: {e}")
-        await interaction.response.send_message(f"❌ Unexpected error in settings: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
+        await _report_error(interaction, e, "settings", _SETTINGS_ERRORS, "Unexpected error in settings")
+
+_GENERATE_ERRORS = {
+    discord.Forbidden: ("Permission error", "I don't have permission to send messages in the review channel."),
+    discord.NotFound: ("Channel not found", "One of the configured channels no longer exists. Please reconfigure using `/settings`."),
+    discord.HTTPException: ("Discord API error", None),
+}
 
 @bot.tree.command(name="generate", description="Post the review embed in the configured review channel")
 @discord.app_commands.default_permissions(administrator=True)
 @app_commands.checks.has_permissions(manage_guild=True)
 async def generate_review_post(interaction: discord.Interaction):
     try:
-        guild_id = str(interaction.guild.id)
+        # Acknowledge within Discord's 3 second window; everything below answers via followups
+        await interaction.response.defer(ephemeral=True)
+
+        guild_id = interaction.guild.id
         settings = load_settings()
+        config = settings.get(guild_id)
         
-        if (guild_id not in settings or "review_channel" not in settings[guild_id] or "testimonial_channel" not in settings[guild_id]):
-            await interaction.response.send_message("❌ You must set both the review and testimonial channels first using `/settings`.", ephemeral=True)
+        if config is None or config.review_channel is None or config.testimonial_channel is None:
+            await _err(interaction, "You must set both the review and testimonial channels first using `/settings`.")
             return
 
-        review_channel_id = settings[guild_id]["review_channel"]
-        testimonial_channel_id = settings[guild_id]["testimonial_channel"]
-        role_id = settings.get(guild_id, {}).get("reviewable_role")
-        reward_role_id = settings.get(guild_id, {}).get("reward_role")
+        review_channel_id = config.review_channel
+        testimonial_channel_id = config.testimonial_channel
         
         # Validate channels exist and bot has permissions
-        review_channel = interaction.guild.get_channel(review_channel_id)
-        testimonial_channel = interaction.guild.get_channel(testimonial_channel_id)
+        guild = interaction.guild
+        review_channel = guild.get_channel(review_channel_id)
+        testimonial_channel = guild.get_channel(testimonial_channel_id)
 
         if review_channel is None:
-            await interaction.response.send_message("❌ Review channel not found. Please reconfigure using `/settings`.", ephemeral=True)
+            await _err(interaction, "Review channel not found. Please reconfigure using `/settings`.")
             return
             
         if testimonial_channel is None:
-            await interaction.response.send_message("❌ Testimonial channel not found. Please reconfigure using `/settings`.", ephemeral=True)
+            await _err(interaction, "Testimonial channel not found. Please reconfigure using `/settings`.")
             return
 
-        if not review_channel.permissions_for(interaction.guild.me).send_messages:
-            await interaction.response.send_message("❌ I don't have permission to send messages in the review channel.", ephemeral=True)
+        me = guild.me
+        if not _can_send(review_channel, me):
+            await _err(interaction, "I don't have permission to send messages in the review channel.")
             return
             
-        if not testimonial_channel.permissions_for(interaction.guild.me).send_messages:
-            await interaction.response.send_message("❌ I don't have permission to send messages in the testimonial channel.", ephemeral=True)
+        if not _can_send(testimonial_channel, me):
+            await _err(interaction, "I don't have permission to send messages in the testimonial channel.")
             return
 
-        embed = discord.Embed(title="💬 Leave a Review", description="Click the button below to review a staff member of this server.", color=discord.Color.blurple())
-        view = ReviewButtonView(testimonial_channel_id, role_id, reward_role_id)
-        
-        message = await review_channel.send(embed=embed, view=view)
-
-        settings[guild_id]["review_message_id"] = message.id
-        save_settings(settings)
+        await post_review_message(settings, guild_id, review_channel)
 
-        bot.add_view(ReviewButtonView(testimonial_channel_id, role_id, reward_role_id), message_id=message.id)
-
-        await interaction.response.send_message(f"✅ Review embed posted in {review_channel.mention}", ephemeral=True)
+        await _ok(interaction, f"Review embed posted in {review_channel.mention}")
         
-    except discord.Forbidden as e:
-        logger.error(f"Permission error in generate command: {e}")
-        await interaction.response.send_message("❌ I don't have permission to send messages in the review channel.", ephemeral=True)
-    except discord.NotFound as e:
-        logger.error(f"Channel not found in generate command: {e}")
-        await interaction.response.send_message("❌ One of the configured channels no longer exists. Please reconfigure using `/settings`.", ephemeral=True)
-    except discord.HTTPException as e:
-        logger.error(f"Discord API error in generate command: {e}")
-        await interaction.response.send_message(f"❌ Discord API error: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
     except Exception as e:
-        logger.error(f"Unexpected error in generate command: {e}")
-        await interaction.response.send_message(f"❌ Unexpected error while generating review post: {str(e)[:100]}{'...' if len(str(e)) > 100 else ''}", ephemeral=True)
+        await _report_error(interaction, e, "generate", _GENERATE_ERRORS, "Unexpected error while generating review post")
 
-bot.run(TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    bot.run(TOKEN)